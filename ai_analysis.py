@@ -1,8 +1,60 @@
 import google.generativeai as genai
 import os
 import json
+import threading
+import time
 from collections import Counter
 
+from cassette import generate_content # model.generate_content with record/replay support
+
+SENTIMENTS = ("Positive", "Neutral", "Negative")
+
+# Structured-output mode: the model is constrained to this compact schema
+# (short keys, enum sentiment, capped highlight counts) to cut output tokens.
+GEMINI_STRUCTURED_MODEL = os.environ.get("GEMINI_STRUCTURED_MODEL", "gemini-1.5-flash")
+MAX_HIGHLIGHTS = 3
+MAX_BUZZWORDS = 5
+STRUCTURED_MAX_OUTPUT_TOKENS = 256
+STRUCTURED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "s": {"type": "string", "format": "enum", "enum": list(SENTIMENTS)},
+        "p": {"type": "array", "items": {"type": "string"}, "max_items": MAX_HIGHLIGHTS},
+        "n": {"type": "array", "items": {"type": "string"}, "max_items": MAX_HIGHLIGHTS},
+        "k": {"type": "array", "items": {"type": "string"}, "max_items": MAX_BUZZWORDS},
+    },
+    "required": ["s", "p", "n", "k"],
+}
+
+# Per-process counters keyed by (output mode, metric name); see get_gemini_metrics()
+_gemini_metrics = Counter()
+_gemini_metrics_lock = threading.Lock()
+
+def _increment_metric(mode, name, amount=1):
+    with _gemini_metrics_lock:
+        _gemini_metrics[(mode, name)] += amount
+
+def get_gemini_metrics():
+    """
+    Returns {mode: {"responses", "parse_failures", "parse_retries", "output_tokens",
+    "parse_failure_rate"}} for the Gemini calls made by this process.
+    """
+    with _gemini_metrics_lock:
+        snapshot = dict(_gemini_metrics)
+    metrics = {}
+    for (mode, name), value in snapshot.items():
+        metrics.setdefault(mode, {"responses": 0, "parse_failures": 0, "parse_retries": 0, "output_tokens": 0})
+        metrics[mode][name] = value
+    for mode_metrics in metrics.values():
+        responses = mode_metrics["responses"]
+        mode_metrics["parse_failure_rate"] = round(mode_metrics["parse_failures"] / responses, 4) if responses else 0.0
+    return metrics
+
+def _record_output_tokens(mode, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        _increment_metric(mode, "output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+
 # Configure the Gemini API key
 # This should be done once, ideally when the application starts.
 # However, for modularity, we can ensure it's configured before making a call.
@@ -72,17 +124,133 @@ def parse_gemini_response(text_response, article_title, article_url):
         }
 
 
-def analyze_batch_with_gemini(articles_data, gemini_api_key):
+def _deadline_exceeded_result(article_title, article_url):
+    return {
+        "sentiment": "Neutral",
+        "error": "Deadline exceeded",
+        "deadline_exceeded": True,
+        "source_title": article_title,
+        "source_url": article_url
+    }
+
+
+def parse_structured_response(text_response, article_title, article_url):
+    """
+    Single-pass tolerant parser for structured-output responses.
+    Accepts the compact keys (s/p/n/k) or the long ones, ignores any text around
+    the JSON object and caps list lengths. Returns None if the response is malformed
+    (not a JSON object, or no valid sentiment) so the caller can retry.
+    """
+    if not text_response:
+        return None
+    start = text_response.find("{")
+    end = text_response.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text_response[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    sentiment = str(data.get("s") or data.get("sentiment") or "").strip().capitalize()
+    if sentiment not in SENTIMENTS:
+        return None
+
+    def _phrases(short_key, long_key, cap):
+        value = data.get(short_key, data.get(long_key))
+        if not isinstance(value, list):
+            return []
+        return [item.strip() for item in value if isinstance(item, str) and item.strip()][:cap]
+
+    return {
+        "sentiment": sentiment,
+        "positive_highlights": _phrases("p", "positive_highlights", MAX_HIGHLIGHTS),
+        "negative_highlights": _phrases("n", "negative_highlights", MAX_HIGHLIGHTS),
+        "key_buzzwords": _phrases("k", "key_buzzwords", MAX_BUZZWORDS),
+        "source_title": article_title,
+        "source_url": article_url
+    }
+
+
+def _structured_prompt(article_text):
+    return f"""\
+Classify the sentiment of this news article towards the IPO or company in the context of its public offering.
+s: sentiment. p: up to {MAX_HIGHLIGHTS} positive highlights. n: up to {MAX_HIGHLIGHTS} negative highlights. k: up to {MAX_BUZZWORDS} buzzwords.
+Use short phrases (max 8 words each) and empty lists when there are none.
+
+---
+{article_text[:3000]}
+---
+"""
+
+
+def _analyze_structured(model, article_text, article_title, article_url, deadline):
+    """
+    Analyzes one article in structured-output mode, retrying once (at temperature 0)
+    only if the first response is malformed. A response that is still malformed is
+    returned as an error so it is left out of the sentiment breakdown.
+    """
+    prompt = _structured_prompt(article_text)
+    for attempt, temperature in enumerate((0.3, 0.0)):
+        request_options = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Not a parse failure: the retry (or the first call) never got to run
+                return _deadline_exceeded_result(article_title, article_url)
+            request_options = {"timeout": remaining}
+        if attempt:
+            _increment_metric("structured", "parse_retries")
+        response = generate_content(
+            model,
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                max_output_tokens=STRUCTURED_MAX_OUTPUT_TOKENS,
+                response_mime_type="application/json",
+                response_schema=STRUCTURED_RESPONSE_SCHEMA
+            ),
+            request_options=request_options
+        )
+        _record_output_tokens("structured", response)
+        parsed_result = parse_structured_response(response.text, article_title, article_url)
+        if parsed_result is not None:
+            _increment_metric("structured", "responses")
+            return parsed_result
+        print(f"Malformed structured response for article '{article_title}': {response.text[:200]}")
+
+    _increment_metric("structured", "responses")
+    _increment_metric("structured", "parse_failures")
+    return {
+        "sentiment": "Neutral",
+        "positive_highlights": [],
+        "negative_highlights": [],
+        "key_buzzwords": [],
+        "error": "Malformed structured response",
+        "error_parsing": True,
+        "raw_response": "Malformed structured response.",
+        "source_title": article_title,
+        "source_url": article_url
+    }
+
+
+def analyze_batch_with_gemini(articles_data, gemini_api_key, deadline=None, structured=False):
     """
     Analyzes a batch of articles using Gemini Pro.
-    Each article_data in articles_data should be a dict with 'text', 'title', 'source_url'.
+    articles_data is a list of data_ingestion.Article records (with 'text', 'title', 'url').
     Returns a list of sentiment analysis results for each article.
+    If `deadline` (an absolute time.monotonic() value) passes, the in-flight call is
+    timed out and the remaining articles are returned as "Deadline exceeded" errors.
+    With `structured=True`, GEMINI_STRUCTURED_MODEL is asked for schema-constrained
+    JSON output (see STRUCTURED_RESPONSE_SCHEMA) instead of free text.
     """
     if not articles_data:
         return []
 
     configure_gemini(gemini_api_key)
-    model = genai.GenerativeModel('gemini-pro')
+    model = genai.GenerativeModel(GEMINI_STRUCTURED_MODEL if structured else 'gemini-pro')
 
     results = []
 
@@ -90,9 +258,17 @@ def analyze_batch_with_gemini(articles_data, gemini_api_key):
     # the model understands it's separate documents.
     # A single large prompt with all texts might exceed token limits or confuse the model.
     for article_info in articles_data:
-        article_text = article_info.get("text", "")
-        article_title = article_info.get("title", "N/A")
-        article_url = article_info.get("source_url", "N/A")
+        article_text = article_info.text
+        article_title = article_info.title
+        article_url = article_info.url
+
+        request_options = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                results.append(_deadline_exceeded_result(article_title, article_url))
+                continue
+            request_options = {"timeout": remaining}
 
         if not article_text.strip():
             results.append({
@@ -131,8 +307,13 @@ If there are no specific positive or negative highlights, return an empty list f
 Do not include any explanations or text outside of this JSON structure.
 """
         try:
+            if structured:
+                results.append(_analyze_structured(model, article_text, article_title, article_url, deadline))
+                continue
+
             # print(f"Sending to Gemini: {article_text[:100]}...") # For debugging
-            response = model.generate_content(
+            response = generate_content(
+                model,
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     # candidate_count=1, # Default is 1
@@ -146,12 +327,21 @@ Do not include any explanations or text outside of this JSON structure.
                 #     {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT","threshold": "BLOCK_NONE"},
                 #     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT","threshold": "BLOCK_NONE"},
                 # ]
+                request_options=request_options
             )
             # print(f"Gemini Response Text: {response.text}") # For debugging
+            _record_output_tokens("text", response)
             parsed_result = parse_gemini_response(response.text, article_title, article_url)
+            _increment_metric("text", "responses")
+            if parsed_result.get("error_parsing"):
+                _increment_metric("text", "parse_failures")
             results.append(parsed_result)
 
         except Exception as e:
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"Gemini call for article '{article_title}' cancelled at the deadline.")
+                results.append(_deadline_exceeded_result(article_title, article_url))
+                continue
             print(f"Error calling Gemini API for article '{article_title}': {e}")
             if hasattr(e, 'response') and e.response: # type: ignore
                 print(f"Gemini API Error Response: {e.response.prompt_feedback}") # type: ignore
@@ -308,6 +498,7 @@ if __name__ == '__main__':
     # This is for direct testing of this module.
     # You need to set GOOGLE_API_KEY environment variable.
     print("Testing AI Analysis Module...")
+    from data_ingestion import Article
     test_api_key = os.environ.get("GEMINI_API_KEY") # Ensure this is set for testing
     if not test_api_key:
         print("GEMINI_API_KEY environment variable not set. Cannot perform live Gemini test.")
@@ -316,26 +507,30 @@ if __name__ == '__main__':
         configure_gemini(test_api_key) # Configure with the key
 
         sample_articles_for_analysis = [
-            {
-                "text": "Excitement is building for the upcoming TechCorp IPO. Analysts predict strong opening day gains due to innovative technology and high pre-booking numbers. Demand is off the charts!",
-                "title": "TechCorp IPO Soars with High Hopes",
-                "source_url": "http://example.com/news1"
-            },
-            {
-                "text": "While TechCorp shows promise, some market watchers are cautious. The current volatile market conditions and the company's high valuation present potential risks for investors. Regulatory hurdles also loom.",
-                "title": "TechCorp IPO: A Mix of Promise and Peril",
-                "source_url": "http://example.com/news2"
-            },
-            {
-                "text": "The TechCorp IPO is just another tech offering. It has some standard features but nothing particularly groundbreaking. It will likely perform as per the market average.",
-                "title": "TechCorp: A Standard IPO Offering",
-                "source_url": "http://example.com/news3"
-            },
-            {
-                "text": "Major concerns are being raised about TechCorp's leadership and their ability to navigate the competitive landscape post-IPO. Several key executives have recently departed, casting a shadow.",
-                "title": "Leadership Woes Plague TechCorp Ahead of IPO",
-                "source_url": "http://example.com/news4"
-            }
+            Article(
+                title="TechCorp IPO Soars with High Hopes",
+                url="http://example.com/news1",
+                text="Excitement is building for the upcoming TechCorp IPO. Analysts predict strong opening day gains due to innovative technology and high pre-booking numbers. Demand is off the charts!",
+                source="example.com"
+            ),
+            Article(
+                title="TechCorp IPO: A Mix of Promise and Peril",
+                url="http://example.com/news2",
+                text="While TechCorp shows promise, some market watchers are cautious. The current volatile market conditions and the company's high valuation present potential risks for investors. Regulatory hurdles also loom.",
+                source="example.com"
+            ),
+            Article(
+                title="TechCorp: A Standard IPO Offering",
+                url="http://example.com/news3",
+                text="The TechCorp IPO is just another tech offering. It has some standard features but nothing particularly groundbreaking. It will likely perform as per the market average.",
+                source="example.com"
+            ),
+            Article(
+                title="Leadership Woes Plague TechCorp Ahead of IPO",
+                url="http://example.com/news4",
+                text="Major concerns are being raised about TechCorp's leadership and their ability to navigate the competitive landscape post-IPO. Several key executives have recently departed, casting a shadow.",
+                source="example.com"
+            )
         ]
 
         print(f"\nAnalyzing {len(sample_articles_for_analysis)} sample articles with Gemini Pro...")
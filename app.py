@@ -1,6 +1,19 @@
-from flask import Flask, request, jsonify, render_template, make_response # Added make_response
+from flask import Flask, request, jsonify, render_template, make_response, g # Added make_response
 import os
+import cProfile
+import functools
+import hmac
+import io
+import marshal
+import math
+import pstats
+import gzip
+import hashlib
+import json
+import time
 from datetime import datetime
+import click
+from werkzeug.security import safe_join
 
 # WeasyPrint import - will only be used if the library is installed
 try:
@@ -10,6 +23,13 @@ except ImportError:
     WEASYPRINT_AVAILABLE = False
     print("Warning: WeasyPrint not installed. PDF export will not be available.")
 
+# Brotli is optional - responses fall back to gzip if it is not installed
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
@@ -19,141 +39,202 @@ app = Flask(__name__, template_folder='templates', static_folder='static')
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 NEWS_API_KEY = os.environ.get("NEWS_API_KEY") # Added for NewsAPI
 
+# HTTP caching configuration
+# Bump ANALYSIS_VERSION whenever the prompt or scoring changes so that
+# clients holding an old ETag are sent the new result.
+ANALYSIS_VERSION = "2"
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", "900")) # Seconds an analysis result is reused
+# Seconds a partial (deadline-truncated) result is reused, so polling clients get it
+# back (and 304s) for a while instead of re-running the whole Gemini batch each time
+PARTIAL_ANALYSIS_CACHE_TTL = int(os.environ.get("PARTIAL_ANALYSIS_CACHE_TTL", "60"))
+NEWS_CACHE_TTL = int(os.environ.get("NEWS_CACHE_TTL", "600")) # Seconds fetched articles are reused
+COMPRESS_MIN_SIZE = 500 # Bytes; smaller bodies are not worth compressing
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/pdf"}
+STATIC_MAX_AGE = 31536000 # One year for fingerprinted static assets
+
+# Latency budget for a single lookup. Overridable per request with ?deadline=<seconds>.
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", "20"))
+MAX_REQUEST_DEADLINE = 60.0
+# Share of the remaining budget a lookup may spend waiting for another worker to fill
+# the cache; the rest is kept so it can still compute the result itself in time.
+CACHE_WAIT_FRACTION = 0.5
+
+# "paginated" fetches NewsAPI pages concurrently until enough relevant articles are found;
+# "single" issues one NewsAPI request per lookup.
+NEWSAPI_INGESTION_MODE = os.environ.get("NEWSAPI_INGESTION_MODE", "paginated")
+
+# "structured" asks Gemini for schema-constrained JSON output (compact, cheaper to generate);
+# "text" uses the original free-text prompt with gemini-pro.
+GEMINI_OUTPUT_MODE = os.environ.get("GEMINI_OUTPUT_MODE", "structured")
+
+# Shared secret for the profile=1 / record=1 debug options (sent as X-Debug-Token).
+# The options are disabled when this is not set.
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN")
+PROFILE_STATS_LIMIT = 60 # Functions listed in the text profile
+
 # Import data ingestion functions
-from data_ingestion import fetch_news_for_ipo # extract_text_from_html is not directly used in app.py
+from data_ingestion import fetch_news_for_ipo, fetch_news_for_ipos, is_relevant_article # extract_text_from_html is not directly used in app.py
 # Import AI analysis functions
-from ai_analysis import analyze_batch_with_gemini, calculate_overall_sentiment
+from ai_analysis import analyze_batch_with_gemini, calculate_overall_sentiment, get_gemini_metrics
+# Import the IPO name index used for autocomplete and name canonicalization
+from ipo_index import IPOIndex, normalize_ipo_name
+# Import the cache shared by ingestion results and analysis results (see CACHE_BACKEND)
+from cache_backend import create_cache
+# Import record/replay of upstream responses
+from cassette import Cassette, active_cassette
+
+ipo_index = IPOIndex()
+cache = create_cache()
+MAX_SUGGESTIONS = 20
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def get_mock_data(company_name):
+    # Mock data is returned in dev/test mode when API keys are missing or
+    # when actual data fetching or analysis fails.
+    print(f"Warning: API key missing or issue in data processing for {company_name}. Returning mock data.")
+    mock_data = {
+        "company_name": company_name,
+        "ipo_date": "N/A (mock data)",
+        "sentiment_breakdown": {"Positive": 40, "Neutral": 30, "Negative": 30},
+        "market_sentiment_score": 3.5, # ((40*5) + (30*3) + (30*1)) / 100 = (200+90+30)/100 = 3.2 - corrected
+        "verdict": "Cautious Subscribe",
+        "highlights": {
+            "positive": ["Strong pre-booking.", "Innovative product line."],
+            "negative": ["High valuation concerns.", "Intense market competition."]
+        },
+        "top_snippets": [
+            {"text": "Investor enthusiasm is high for XYZ's upcoming IPO.", "sentiment": "Positive", "source": "NewsSiteA"},
+            {"text": "Analysts advise caution due to current market volatility affecting IPOs.", "sentiment": "Neutral", "source": "ReportBC"},
+            {"text": "Concerns about XYZ's debt load are surfacing pre-IPO.", "sentiment": "Negative", "source": "ForumPostX"}
+        ]
+    }
+    # Recalculate score for mock data
+    pos_pct = mock_data["sentiment_breakdown"]["Positive"]
+    neu_pct = mock_data["sentiment_breakdown"]["Neutral"]
+    neg_pct = mock_data["sentiment_breakdown"]["Negative"]
+    score = ((pos_pct * 5) + (neu_pct * 3) + (neg_pct * 1)) / 100
+    mock_data["market_sentiment_score"] = round(score, 2)
+
+    if score >= 4.0:
+        mock_data["verdict"] = "Strong Subscribe"
+    elif score >= 3.0:
+        mock_data["verdict"] = "Cautious Subscribe"
+    elif score >= 2.0:
+        mock_data["verdict"] = "Neutral"
+    else:
+        mock_data["verdict"] = "Avoid"
+    return mock_data
+
+def _parse_deadline():
+    """
+    Returns the absolute time.monotonic() deadline for this request, or None if the
+    `deadline` query parameter is invalid. The budget is clamped to MAX_REQUEST_DEADLINE.
+    """
+    budget = request.args.get('deadline', REQUEST_DEADLINE)
+    try:
+        budget = float(budget)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(budget) or budget <= 0:
+        return None
+    return time.monotonic() + min(budget, MAX_REQUEST_DEADLINE)
+
+def _cache_bypassed():
+    # Profiled, recorded and replayed requests must exercise the full pipeline
+    return g.get('bypass_cache', False) or active_cassette() is not None
+
+def _format_profile(profiler, output_format):
+    """
+    Returns a response with the profile as text (sorted by cumulative time) or,
+    for output_format="pstats", as a binary stats dump for snakeviz/flameprof.
+    """
+    if output_format == "pstats":
+        profiler.create_stats()
+        response = make_response(marshal.dumps(profiler.stats))
+        response.headers['Content-Type'] = 'application/octet-stream'
+        response.headers['Content-Disposition'] = 'attachment; filename="request.pstats"'
+        return response
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_STATS_LIMIT)
+    response = make_response(stream.getvalue())
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    return response
+
+def debuggable(view):
+    """
+    Adds the guarded debug options to a view:
+      profile=1  run the request under cProfile and return the stats instead of the body
+                 (profile_format=pstats for a binary dump)
+      record=1   save every upstream response seen by the request to a cassette file
+                 in CASSETTE_DIR (path returned in X-Cassette-Path), for `flask replay-cassette`
+    Both require DEBUG_TOKEN to be configured and sent in the X-Debug-Token header,
+    and both bypass the cache so the whole pipeline runs.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        profile = request.args.get('profile') == '1'
+        record = request.args.get('record') == '1'
+        if not profile and not record:
+            return view(*args, **kwargs)
+        if not DEBUG_TOKEN or not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN):
+            return jsonify({"error": "Debug options are not enabled for this request."}), 403
+
+        g.bypass_cache = True
+        recorder = None
+        cassette_token = None
+        if record:
+            debug_args = {'profile', 'record', 'profile_format'}
+            recorder = Cassette("record", request_info={
+                "path": request.path,
+                "args": {key: value for key, value in request.args.items() if key not in debug_args},
+                "recorded_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+                # Settings that decide which upstream calls are made, re-applied on replay
+                "config": {
+                    "NEWSAPI_INGESTION_MODE": NEWSAPI_INGESTION_MODE,
+                    "GEMINI_OUTPUT_MODE": GEMINI_OUTPUT_MODE,
+                    "has_news_api_key": bool(NEWS_API_KEY),
+                    "has_gemini_api_key": bool(GEMINI_API_KEY),
+                },
+            })
+            cassette_token = recorder.activate()
+        profiler = cProfile.Profile() if profile else None
+        try:
+            if profiler:
+                response = make_response(profiler.runcall(view, *args, **kwargs))
+            else:
+                response = make_response(view(*args, **kwargs))
+        finally:
+            if cassette_token is not None:
+                Cassette.deactivate(cassette_token)
+
+        if profiler:
+            response = _format_profile(profiler, request.args.get('profile_format', 'text'))
+        if recorder:
+            cassette_path = recorder.save()
+            app.logger.info(f"Recorded upstream responses for {request.full_path} to {cassette_path}")
+            response.headers['X-Cassette-Path'] = cassette_path
+        return response
+    return wrapper
+
 @app.route('/api/sentiment', methods=['GET'])
+@debuggable
 def get_sentiment():
-    ipo_name = request.args.get('ipo_name')
+    ipo_name = request.args.get('ipo_name', '').strip()
     if not ipo_name:
         return jsonify({"error": "ipo_name parameter is required"}), 400
-
-    # NOTE: For actual Gemini analysis, we'll check GEMINI_API_KEY later,
-    # right before calling Gemini. For data ingestion, we might need NEWS_API_KEY.
-
-    # Mock data generation moved to a separate block for clarity,
-    # will be triggered if actual data fetching or analysis fails AND in dev/test mode.
-    def get_mock_data(company_name):
-        print(f"Warning: API key missing or issue in data processing for {company_name}. Returning mock data.")
-        mock_data = {
-            "company_name": company_name,
-            "ipo_date": "N/A (mock data)",
-                "sentiment_breakdown": {"Positive": 40, "Neutral": 30, "Negative": 30},
-                "market_sentiment_score": 3.5, # ((40*5) + (30*3) + (30*1)) / 100 = (200+90+30)/100 = 3.2 - corrected
-                "verdict": "Cautious Subscribe",
-                "highlights": {
-                    "positive": ["Strong pre-booking.", "Innovative product line."],
-                    "negative": ["High valuation concerns.", "Intense market competition."]
-                },
-                "top_snippets": [
-                    {"text": "Investor enthusiasm is high for XYZ's upcoming IPO.", "sentiment": "Positive", "source": "NewsSiteA"},
-                    {"text": "Analysts advise caution due to current market volatility affecting IPOs.", "sentiment": "Neutral", "source": "ReportBC"},
-                    {"text": "Concerns about XYZ's debt load are surfacing pre-IPO.", "sentiment": "Negative", "source": "ForumPostX"}
-                ]
-            }
-            # Recalculate score for mock data
-            pos_pct = mock_data["sentiment_breakdown"]["Positive"]
-            neu_pct = mock_data["sentiment_breakdown"]["Neutral"]
-            neg_pct = mock_data["sentiment_breakdown"]["Negative"]
-            score = ((pos_pct * 5) + (neu_pct * 3) + (neg_pct * 1)) / 100
-            mock_data["market_sentiment_score"] = round(score, 2)
-
-            if score >= 4.0:
-                mock_data["verdict"] = "Strong Subscribe"
-            elif score >= 3.0:
-                mock_data["verdict"] = "Cautious Subscribe"
-            elif score >= 2.0:
-                mock_data["verdict"] = "Neutral"
-            else:
-                mock_data["verdict"] = "Avoid"
-            return mock_data
+    # Known names, aliases and symbols share one canonical name (and cache entry)
+    ipo_name = ipo_index.canonical_name(ipo_name)
+    deadline = _parse_deadline()
+    if deadline is None:
+        return jsonify({"error": "deadline must be a positive number of seconds"}), 400
 
     try:
-        # Step 1: Fetch data
-        if not NEWS_API_KEY and not (os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True"):
-            return jsonify({"error": "NEWS_API_KEY not configured on the server."}), 500
-
-        raw_articles = fetch_news_for_ipo(ipo_name, NEWS_API_KEY, max_articles=30)
-
-        if not raw_articles:
-            if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
-                return jsonify(get_mock_data(ipo_name))
-            return jsonify({"error": "Could not fetch any articles for the IPO name."}), 404
-
-        # Step 2: Extract text content (basic filtering is part of fetching and text extraction)
-        # We'll aim to get a list of simple text strings for Gemini
-        processed_texts = []
-        for article in raw_articles:
-            text_content = ""
-            if article.get('content'): # NewsAPI often provides 'content'
-                text_content = article['content']
-            elif article.get('description'):
-                text_content = article['description']
-
-            # If we had full HTML, we'd use extract_text_from_html here
-            # For NewsAPI, content is usually already somewhat clean.
-            # A more robust solution would fetch URL and parse if content is truncated.
-            if text_content:
-                 # Basic relevance check - ensure IPO name is mentioned
-                if ipo_name.lower() in text_content.lower():
-                    processed_texts.append({
-                        "text": text_content,
-                        "source_url": article.get("url", "N/A"),
-                        "title": article.get("title", "N/A")
-                    })
-
-        if not processed_texts:
-            if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
-                return jsonify(get_mock_data(ipo_name))
-            return jsonify({"error": "No relevant articles found after filtering."}), 404
-
-        # Placeholder for Gemini Analysis (Step 3)
-        if not GEMINI_API_KEY:
-            if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
-                # Return mock data if Gemini key is missing in dev/test
-                print("Warning: GEMINI_API_KEY not found. Cannot perform live Gemini Analysis. Returning mock data.")
-                return jsonify(get_mock_data(ipo_name))
-            else: # Not in dev/test, and no API Key
-                app.logger.error("GEMINI_API_KEY not configured on the server for analysis.")
-                return jsonify({"error": "AI Analysis service is not configured."}), 500
-
-        # Step 3: Analyze with Gemini
-        # `processed_texts` is a list of dicts: {"text": ..., "source_url": ..., "title": ...}
-        # `analyze_batch_with_gemini` expects this structure.
-        app.logger.info(f"Sending {len(processed_texts)} articles to Gemini for analysis for IPO: {ipo_name}")
-        individual_analysis_results = analyze_batch_with_gemini(processed_texts, GEMINI_API_KEY)
-
-        if not individual_analysis_results:
-            app.logger.warn(f"Gemini analysis returned no results for {ipo_name}.")
-            # Fallback to mock data if in dev/test, otherwise error
-            if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
-                return jsonify(get_mock_data(ipo_name))
-            return jsonify({"error": "AI analysis failed to produce results."}), 500
-
-        # Step 4: Calculate overall sentiment, score, verdict
-        overall_sentiment_summary = calculate_overall_sentiment(individual_analysis_results)
-
-        # Construct the final response
-        final_response = {
-            "company_name": ipo_name,
-            "ipo_date": "N/A - (To be sourced or manually input)", # Placeholder
-            "sentiment_breakdown": overall_sentiment_summary["sentiment_breakdown"],
-            "market_sentiment_score": overall_sentiment_summary["market_sentiment_score"],
-            "verdict": overall_sentiment_summary["verdict"],
-            "highlights": overall_sentiment_summary["highlights"],
-            "top_snippets": overall_sentiment_summary["top_snippets"],
-            "source_article_count": len(processed_texts),
-            # Optionally include individual analysis for debugging or more detailed view:
-            # "detailed_analysis": individual_analysis_results
-        }
-        return jsonify(final_response)
-
+        # A cache hit costs no upstream calls, so a matching If-None-Match
+        # is answered with 304 without redoing any work.
+        analysis_data, etag = _get_analysis_with_etag(ipo_name, deadline=deadline)
     except Exception as e:
         app.logger.error(f"Critical error in get_sentiment for {ipo_name}: {e}", exc_info=True)
         # In case of any error during real processing, fallback to mock data in dev/test
@@ -161,31 +242,44 @@ def get_sentiment():
             return jsonify(get_mock_data(ipo_name))
         return jsonify({"error": "An error occurred while processing your request."}), 500
 
+    if analysis_data.get("error_message"):
+        return jsonify({"error": analysis_data["error_message"]}), analysis_data.get("status_code", 500)
+
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    response = jsonify(analysis_data)
+    response.set_etag(etag, weak=True)
+    # Clients may keep the body but must revalidate it with the ETag on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Internal function to get sentiment data, used by both JSON and PDF endpoints
-def _get_sentiment_analysis_data(ipo_name_param):
+def _get_sentiment_analysis_data(ipo_name_param, deadline=None):
     # This function encapsulates the logic from the original get_sentiment()
     # and returns the data dict or an error dict.
+    # `deadline` is an absolute time.monotonic() value; work still outstanding when it
+    # passes is cancelled and the result is built from whatever completed ("partial").
+    started_at = time.monotonic()
 
     # Data Ingestion
     if not NEWS_API_KEY and not (os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True"):
         return {"error_message": "NEWS_API_KEY not configured on the server.", "status_code": 500}
 
-    raw_articles = fetch_news_for_ipo(ipo_name_param, NEWS_API_KEY, max_articles=30)
+    # The canonical name keys the cache and names the company; news is searched and
+    # filtered by all of the IPO's names, since articles often use only an alias.
+    search_terms = ipo_index.search_terms(ipo_name_param)
+    raw_articles, ingestion_cut_short = _fetch_articles(ipo_name_param, deadline=deadline)
 
     if not raw_articles:
         if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
             return get_mock_data(ipo_name_param) # Returns mock data directly
+        if deadline is not None and time.monotonic() >= deadline:
+            return {"error_message": "Deadline exceeded before any articles were fetched.", "status_code": 504}
         return {"error_message": "Could not fetch any articles for the IPO name.", "status_code": 404}
 
-    processed_texts = []
-    for article in raw_articles:
-        text_content = article.get('content') or article.get('description', "")
-        if text_content and ipo_name_param.lower() in text_content.lower():
-            processed_texts.append({
-                "text": text_content,
-                "source_url": article.get("url", "N/A"),
-                "title": article.get("title", "N/A")
-            })
+    # Article records are passed straight through to analysis without copying their text
+    processed_texts = [article for article in raw_articles if is_relevant_article(article, search_terms)]
 
     if not processed_texts:
         if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
@@ -202,7 +296,8 @@ def _get_sentiment_analysis_data(ipo_name_param):
             return {"error_message": "AI Analysis service is not configured.", "status_code": 500}
 
     app.logger.info(f"Sending {len(processed_texts)} articles to Gemini for analysis for IPO: {ipo_name_param}")
-    individual_analysis_results = analyze_batch_with_gemini(processed_texts, GEMINI_API_KEY)
+    individual_analysis_results = analyze_batch_with_gemini(processed_texts, GEMINI_API_KEY, deadline=deadline,
+                                                            structured=GEMINI_OUTPUT_MODE == "structured")
 
     if not individual_analysis_results:
         app.logger.warn(f"Gemini analysis returned no results for {ipo_name_param}.")
@@ -210,6 +305,14 @@ def _get_sentiment_analysis_data(ipo_name_param):
             return get_mock_data(ipo_name_param)
         return {"error_message": "AI analysis failed to produce results.", "status_code": 500}
 
+    skipped_count = sum(1 for res in individual_analysis_results if res.get("deadline_exceeded"))
+    analyzed_count = sum(1 for res in individual_analysis_results if "error" not in res)
+    if analyzed_count == 0 and skipped_count:
+        app.logger.warn(f"Deadline exceeded before any article was analyzed for {ipo_name_param}.")
+        if os.environ.get("FLASK_ENV") == "development" or os.environ.get("TESTING") == "True":
+            return get_mock_data(ipo_name_param)
+        return {"error_message": "Deadline exceeded before any article was analyzed.", "status_code": 504}
+
     overall_sentiment_summary = calculate_overall_sentiment(individual_analysis_results)
 
     return {
@@ -221,22 +324,173 @@ def _get_sentiment_analysis_data(ipo_name_param):
         "highlights": overall_sentiment_summary["highlights"],
         "top_snippets": overall_sentiment_summary["top_snippets"],
         "source_article_count": len(processed_texts),
+        "partial": skipped_count > 0 or ingestion_cut_short,
+        "coverage": {
+            "ingestion_cut_short_by_deadline": ingestion_cut_short,
+            "articles_fetched": len(raw_articles),
+            "articles_relevant": len(processed_texts),
+            "articles_analyzed": analyzed_count,
+            "articles_skipped_by_deadline": skipped_count,
+            "elapsed_seconds": round(time.monotonic() - started_at, 2),
+        },
     }
 
+def _cache_wait_timeout(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic()) * CACHE_WAIT_FRACTION
+
+def _fetch_articles(ipo_name, deadline=None):
+    """
+    Returns (articles, cut_short_by_deadline) for an IPO through the shared cache,
+    so workers don't repeat the NewsAPI/Google News calls for the same IPO.
+    """
+    def compute():
+        report = {}
+        articles = fetch_news_for_ipo(ipo_name, NEWS_API_KEY, max_articles=30, deadline=deadline,
+                                      paginated=NEWSAPI_INGESTION_MODE == "paginated", report=report,
+                                      search_terms=ipo_index.search_terms(ipo_name))
+        return articles, report["deadline_exceeded"]
+
+    if _cache_bypassed():
+        return compute()
+    return cache.get_or_compute(
+        _news_cache_key(ipo_name),
+        compute,
+        NEWS_CACHE_TTL,
+        # Don't cache empty results or ingestion the deadline cut short
+        should_cache=lambda result: bool(result[0]) and not result[1],
+        wait_timeout=_cache_wait_timeout(deadline)
+    )
+
+def _news_cache_key(ipo_name):
+    return f"articles:{NEWSAPI_INGESTION_MODE}:{normalize_ipo_name(ipo_name)}"
+
+def refresh_news_cache(ipo_names, deadline=None):
+    """
+    Fetches news for a whole watchlist with consolidated NewsAPI queries and stores
+    each IPO's articles under the same cache key _fetch_articles uses, so later
+    lookups skip NewsAPI. Returns {ipo_name: article_count}.
+    """
+    report = {}
+    articles_by_ipo = fetch_news_for_ipos(ipo_names, NEWS_API_KEY, max_articles=30, deadline=deadline,
+                                          search_terms={name: ipo_index.search_terms(name) for name in ipo_names},
+                                          paginated=NEWSAPI_INGESTION_MODE == "paginated", report=report)
+    for ipo_name, articles in articles_by_ipo.items():
+        # Same rule as _fetch_articles: skip empty results and ingestion the deadline cut short
+        if articles and not report["deadline_exceeded"]:
+            cache.set(_news_cache_key(ipo_name), (articles, False), NEWS_CACHE_TTL)
+    return {ipo_name: len(articles) for ipo_name, articles in articles_by_ipo.items()}
+
+@app.cli.command('refresh-news')
+@click.argument('ipo_names', nargs=-1)
+def refresh_news_command(ipo_names):
+    """Refresh cached news for IPO_NAMES (default: every IPO in the index)."""
+    ipo_names = [ipo_index.canonical_name(name) for name in ipo_names] or ipo_index.names()
+    for ipo_name, count in refresh_news_cache(ipo_names).items():
+        click.echo(f"{ipo_name}: {count} articles")
+
+@app.cli.command('replay-cassette')
+@click.argument('cassette_path')
+@click.option('--profile', is_flag=True, help='Print a cProfile report for the replayed request.')
+@click.option('--latency', is_flag=True, help='Sleep for the recorded upstream latency of each call.')
+def replay_cassette_command(cassette_path, profile, latency):
+    """Re-run a recorded request offline against the responses in CASSETTE_PATH."""
+    global NEWSAPI_INGESTION_MODE, GEMINI_OUTPUT_MODE, NEWS_API_KEY, GEMINI_API_KEY
+    cassette = Cassette.load(cassette_path, simulate_latency=latency)
+    path = cassette.request_info.get("path", "/api/sentiment")
+    args = cassette.request_info.get("args", {})
+    config = cassette.request_info.get("config", {})
+
+    # Take the same upstream paths as the recorded request. API keys are never
+    # recorded, so a placeholder stands in for any key that was configured.
+    NEWSAPI_INGESTION_MODE = config.get("NEWSAPI_INGESTION_MODE", NEWSAPI_INGESTION_MODE)
+    GEMINI_OUTPUT_MODE = config.get("GEMINI_OUTPUT_MODE", GEMINI_OUTPUT_MODE)
+    if "has_news_api_key" in config:
+        NEWS_API_KEY = (NEWS_API_KEY or "replay") if config["has_news_api_key"] else None
+    if "has_gemini_api_key" in config:
+        GEMINI_API_KEY = (GEMINI_API_KEY or "replay") if config["has_gemini_api_key"] else None
+
+    client = app.test_client()
+    profiler = cProfile.Profile() if profile else None
+    token = cassette.activate()
+    try:
+        if profiler:
+            response = profiler.runcall(client.get, path, query_string=args)
+        else:
+            response = client.get(path, query_string=args)
+    finally:
+        Cassette.deactivate(token)
+
+    click.echo(f"{response.status} {path}?{'&'.join(f'{k}={v}' for k, v in args.items())}")
+    if response.mimetype == 'application/json':
+        click.echo(response.get_data(as_text=True))
+    if profiler:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_STATS_LIMIT)
+        click.echo(stream.getvalue())
+
+def _compute_etag(analysis_data):
+    """
+    Derives an ETag from a hash of the analysis result and ANALYSIS_VERSION.
+    Per-run coverage (timings, counts) is left out so identical analyses share an ETag.
+    """
+    result = {key: value for key, value in analysis_data.items() if key != "coverage"}
+    payload = json.dumps(result, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{ANALYSIS_VERSION}:{payload}".encode("utf-8")).hexdigest()[:32]
+
+def _get_analysis_with_etag(ipo_name, deadline=None):
+    """
+    Returns (analysis_data, etag) for an IPO through the shared cache, reusing a
+    result for ANALYSIS_CACHE_TTL seconds (PARTIAL_ANALYSIS_CACHE_TTL for partial
+    results). Error results are never cached.
+    """
+    def compute():
+        analysis_data = _get_sentiment_analysis_data(ipo_name, deadline=deadline)
+        return analysis_data, _compute_etag(analysis_data)
+
+    if _cache_bypassed():
+        return compute()
+    return cache.get_or_compute(
+        _analysis_cache_key(ipo_name),
+        compute,
+        lambda result: PARTIAL_ANALYSIS_CACHE_TTL if result[0].get("partial") else ANALYSIS_CACHE_TTL,
+        should_cache=lambda result: not result[0].get("error_message"),
+        wait_timeout=_cache_wait_timeout(deadline)
+    )
+
+def _analysis_cache_key(ipo_name):
+    # Results from another analysis version or Gemini output mode must not be reused
+    return f"analysis:{ANALYSIS_VERSION}:{GEMINI_OUTPUT_MODE}:{normalize_ipo_name(ipo_name)}"
+
+def _not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/sentiment/pdf', methods=['GET'])
+@debuggable
 def get_sentiment_pdf():
     if not WEASYPRINT_AVAILABLE:
         return jsonify({"error": "PDF generation service is not available (WeasyPrint not installed)."}), 501
 
-    ipo_name = request.args.get('ipo_name')
+    ipo_name = request.args.get('ipo_name', '').strip()
     if not ipo_name:
         return jsonify({"error": "ipo_name parameter is required"}), 400
+    # Known names, aliases and symbols share one canonical name (and cache entry)
+    ipo_name = ipo_index.canonical_name(ipo_name)
+    deadline = _parse_deadline()
+    if deadline is None:
+        return jsonify({"error": "deadline must be a positive number of seconds"}), 400
 
     try:
-        analysis_data = _get_sentiment_analysis_data(ipo_name)
+        analysis_data, etag = _get_analysis_with_etag(ipo_name, deadline=deadline)
         if analysis_data.get("error_message"): # Check if our internal helper returned an error structure
              return jsonify({"error": analysis_data["error_message"]}), analysis_data.get("status_code", 500)
 
+        # The report only changes when the analysis does, so skip rendering entirely on a match
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
         # Render HTML template for PDF
         generation_date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
         html_for_pdf = render_template('pdf_template.html', data=analysis_data, generation_date=generation_date_str)
@@ -248,6 +502,8 @@ def get_sentiment_pdf():
         response = make_response(pdf_bytes)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = f'attachment; filename="{ipo_name}_sentiment_report.pdf"'
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
         return response
 
     except Exception as e:
@@ -255,6 +511,104 @@ def get_sentiment_pdf():
         return jsonify({"error": "An error occurred while generating the PDF report."}), 500
 
 
+@app.route('/api/ipos/suggest', methods=['GET'])
+def suggest_ipos():
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+    limit = min(limit, MAX_SUGGESTIONS)
+    response = jsonify({"query": query, "suggestions": ipo_index.suggest(query, limit=limit)})
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Exposes this worker process's Gemini counters in the Prometheus text format.
+    """
+    # Counters live in each gunicorn worker and are not aggregated: a scrape reports
+    # the worker that served it, and counts reset when a worker restarts.
+    metric_types = [
+        ("gemini_responses_total", "responses", "counter", "Gemini responses parsed"),
+        ("gemini_parse_failures_total", "parse_failures", "counter", "Gemini responses that could not be parsed"),
+        ("gemini_parse_retries_total", "parse_retries", "counter", "Retries issued for malformed Gemini responses"),
+        ("gemini_output_tokens_total", "output_tokens", "counter", "Output tokens generated by Gemini"),
+        ("gemini_parse_failure_rate", "parse_failure_rate", "gauge", "Fraction of Gemini responses that could not be parsed"),
+    ]
+    gemini_metrics = sorted(get_gemini_metrics().items())
+    lines = []
+    for metric_name, key, metric_type, description in metric_types:
+        lines.append(f"# HELP {metric_name} {description}, by output mode (this worker process only).")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for mode, mode_metrics in gemini_metrics:
+            lines.append(f'{metric_name}{{mode="{mode}"}} {mode_metrics[key]}')
+    response = make_response("\n".join(lines) + "\n")
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+    return response
+
+# Static asset fingerprinting: url_for('static', ...) gets a ?v=<content hash>
+# so the files can be cached forever and are re-fetched only when they change.
+_static_fingerprints = {} # filename -> (mtime, fingerprint)
+
+def _static_fingerprint(filename):
+    path = safe_join(app.static_folder, filename)
+    if not path or not os.path.isfile(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _static_fingerprints.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        fingerprint = hashlib.md5(f.read()).hexdigest()[:12]
+    _static_fingerprints[filename] = (mtime, fingerprint)
+    return fingerprint
+
+@app.url_defaults
+def _add_static_fingerprint(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        fingerprint = _static_fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.after_request
+def _set_static_cache_headers(response):
+    if request.endpoint == 'static' and response.status_code == 200:
+        version = request.args.get('v')
+        # Only far-future cache when the requested version is the current one
+        if version and version == _static_fingerprint(request.view_args.get('filename', '')):
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+@app.after_request
+def _compress_response(response):
+    """
+    Compresses JSON and PDF responses with brotli or gzip when the client accepts it.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    accept_encodings = request.accept_encodings
+    if BROTLI_AVAILABLE and accept_encodings['br']:
+        response.set_data(brotli.compress(body))
+        response.headers['Content-Encoding'] = 'br'
+    elif accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 if __name__ == '__main__':
     # It's good practice to make host and port configurable,
     # but for simplicity, we'll hardcode for now.
@@ -0,0 +1,74 @@
+"""
+Measures peak memory for decoding and filtering a batch of NewsAPI articles.
+
+Compares the old path (response.json() -> plain dicts -> processed_texts copies)
+with the compact path (decode_newsapi_response -> Article records).
+
+Usage: python benchmarks/article_memory.py [article_count]
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_ingestion import decode_newsapi_response, is_relevant_article
+
+IPO_NAME = "TechCorp"
+SOURCES = ["Reuters", "Bloomberg", "Economic Times", "Mint", "Business Standard"]
+
+
+def build_payload(article_count):
+    articles = []
+    for i in range(article_count):
+        summary = f"{IPO_NAME} IPO draws strong interest from investors, report {i}. " * 3
+        articles.append({
+            "source": {"id": None, "name": SOURCES[i % len(SOURCES)]},
+            "author": f"Reporter {i}",
+            "title": f"{IPO_NAME} IPO update {i}",
+            "description": summary,
+            "url": f"https://news.example.com/{IPO_NAME.lower()}/{i}",
+            "urlToImage": f"https://images.example.com/{IPO_NAME.lower()}/{i}.jpg",
+            "publishedAt": "2024-03-21T10:00:00Z",
+            "content": summary + f"[+{2000 + i} chars]",
+        })
+    return json.dumps({"status": "ok", "totalResults": article_count, "articles": articles}).encode("utf-8")
+
+
+def dict_pipeline(raw_bytes):
+    articles = json.loads(raw_bytes).get("articles", [])
+    processed_texts = []
+    for article in articles:
+        text_content = article.get('content') or article.get('description', "")
+        if text_content and IPO_NAME.lower() in text_content.lower():
+            processed_texts.append({
+                "text": text_content,
+                "source_url": article.get("url", "N/A"),
+                "title": article.get("title", "N/A")
+            })
+    return articles, processed_texts
+
+
+def article_pipeline(raw_bytes):
+    articles = decode_newsapi_response(raw_bytes).get("articles", [])
+    return articles, [article for article in articles if is_relevant_article(article, IPO_NAME)]
+
+
+def measure(pipeline, raw_bytes):
+    tracemalloc.start()
+    result = pipeline(raw_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+if __name__ == '__main__':
+    article_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    raw_bytes = build_payload(article_count)
+    print(f"Payload: {article_count} articles, {len(raw_bytes) / 1e6:.1f} MB")
+    for name, pipeline in [("dicts", dict_pipeline), ("Article records", article_pipeline)]:
+        peak, retained = measure(pipeline, raw_bytes)
+        print(f"{name:>16}: peak {peak / 1e6:6.1f} MB, retained {retained / 1e6:6.1f} MB")
@@ -0,0 +1,79 @@
+"""
+Compares cache hit rate and latency for the "memory" and "sqlite" cache backends
+when requests are spread over 1, 4 and 16 worker processes (as with gunicorn).
+
+Each request looks up one of KEY_COUNT IPO keys (skewed towards popular ones);
+a miss costs COMPUTE_SECONDS, standing in for the NewsAPI + Gemini calls.
+The total number of requests is the same at every worker count.
+
+Usage: python benchmarks/cache_workers.py [total_requests]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_backend import InProcessCache, SQLiteCache
+
+KEY_COUNT = 40
+COMPUTE_SECONDS = 0.05
+TTL = 600
+WORKER_COUNTS = [1, 4, 16]
+
+
+def run_worker(backend, cache_path, request_count, seed, results):
+    cache = SQLiteCache(cache_path) if backend == "sqlite" else InProcessCache()
+    rng = random.Random(seed)
+    computes = 0
+    latencies = []
+    for _ in range(request_count):
+        # Zipf-like popularity: a few IPOs get most of the lookups
+        key = f"analysis:ipo-{int(KEY_COUNT * rng.random() ** 2)}"
+        computed = []
+
+        def compute():
+            computed.append(True)
+            time.sleep(COMPUTE_SECONDS)
+            return {"key": key}
+
+        started = time.perf_counter()
+        cache.get_or_compute(key, compute, TTL)
+        latencies.append(time.perf_counter() - started)
+        computes += len(computed)
+    results.put((request_count, computes, latencies))
+
+
+def run(backend, worker_count, total_requests):
+    cache_path = os.path.join(tempfile.mkdtemp(), "bench-cache.sqlite3")
+    if backend == "sqlite":
+        SQLiteCache(cache_path) # Create the schema before the workers start
+    results = multiprocessing.Queue()
+    per_worker = total_requests // worker_count
+    workers = [multiprocessing.Process(target=run_worker, args=(backend, cache_path, per_worker, seed, results))
+               for seed in range(worker_count)]
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    requests_done = sum(r[0] for r in collected)
+    computes = sum(r[1] for r in collected)
+    latencies = sorted(latency for r in collected for latency in r[2])
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    mean = sum(latencies) / len(latencies)
+    return (requests_done - computes) / requests_done, mean, p99
+
+
+if __name__ == '__main__':
+    total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    print(f"{total_requests} requests over {KEY_COUNT} keys, {COMPUTE_SECONDS * 1000:.0f} ms per miss")
+    print(f"{'backend':>8} {'workers':>7} {'hit rate':>9} {'mean ms':>8} {'p99 ms':>8}")
+    for backend in ["memory", "sqlite"]:
+        for worker_count in WORKER_COUNTS:
+            hit_rate, mean, p99 = run(backend, worker_count, total_requests)
+            print(f"{backend:>8} {worker_count:>7} {hit_rate:>9.1%} {mean * 1000:>8.2f} {p99 * 1000:>8.2f}")
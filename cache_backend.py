@@ -0,0 +1,209 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# Cache backend configuration
+# "sqlite" shares one cache between all gunicorn workers on the host;
+# "memory" keeps a separate cache in each worker process.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(tempfile.gettempdir(), "iposubs-cache.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+LEASE_SECONDS = 90 # Longest a worker may hold a compute lease before others take over
+LEASE_POLL_INTERVAL = 0.05 # Seconds between checks while another worker is computing
+
+
+class InProcessCache:
+    """
+    Cache local to one process. Concurrent get_or_compute calls for the same key
+    within the process are collapsed into a single computation.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {} # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # key -> [lock, users]; an entry exists only while some call is using the key,
+        # so unrelated keys never share a lock and the dict stays small
+        self._key_locks = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+            if len(self._entries) > self.max_entries:
+                # Drop expired entries first, then the ones closest to expiry
+                for stale_key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                    del self._entries[stale_key]
+                overflow = len(self._entries) - self.max_entries
+                if overflow > 0:
+                    for stale_key in sorted(self._entries, key=lambda k: self._entries[k][0])[:overflow]:
+                        del self._entries[stale_key]
+
+    def _key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._key_locks[key]
+
+    def get_or_compute(self, key, compute, ttl, should_cache=None, wait_timeout=None):
+        """
+        Returns the cached value for `key`, or calls `compute()` and caches its result
+        if `should_cache(result)` is true (default: any non-None result). `ttl` may be
+        a callable that returns the TTL for a given result.
+        `compute` may itself call get_or_compute for other keys.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        key_lock = self._key_lock(key)
+        acquired = key_lock.acquire(timeout=wait_timeout if wait_timeout is not None else -1)
+        try:
+            if acquired:
+                value = self.get(key)
+                if value is not None:
+                    return value
+            value = compute()
+            if value is not None and (should_cache is None or should_cache(value)):
+                self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            if acquired:
+                key_lock.release()
+            self._release_key_lock(key)
+
+
+class SQLiteCache:
+    """
+    Cache shared by every process on the host through a SQLite database in WAL mode.
+
+    get_or_compute is atomic across workers: the first worker to miss takes a lease
+    on the key and computes the value, while the others wait for it to appear instead
+    of repeating the upstream calls. Leases expire after LEASE_SECONDS so a crashed
+    worker cannot block a key. Values are pickled; the database is a local file
+    written only by this app.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._owner = uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connection(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl))
+        if conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] > self.max_entries:
+            # Drop expired entries first, then the ones closest to expiry
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT "
+                         "MAX(0, (SELECT COUNT(*) FROM cache) - ?))", (self.max_entries,))
+
+    def _try_acquire_lease(self, key):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if row and row[0] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                         (key, self._owner, now + LEASE_SECONDS))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release_lease(self, key):
+        self._connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def get_or_compute(self, key, compute, ttl, should_cache=None, wait_timeout=None):
+        """
+        Returns the cached value for `key`, or calls `compute()` and caches its result
+        if `should_cache(result)` is true (default: any non-None result). `ttl` may be
+        a callable that returns the TTL for a given result.
+        While another worker holds the lease this waits up to `wait_timeout` seconds
+        (default: until the lease expires) before computing the value itself, so callers
+        with a deadline should pass only part of their remaining time.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        give_up_at = time.monotonic() + wait_timeout if wait_timeout is not None else None
+        acquired = self._try_acquire_lease(key)
+        while not acquired:
+            time.sleep(LEASE_POLL_INTERVAL)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if give_up_at is not None and time.monotonic() >= give_up_at:
+                break
+            acquired = self._try_acquire_lease(key)
+
+        try:
+            if acquired:
+                # Another worker may have finished between our miss and taking the lease
+                value = self.get(key)
+                if value is not None:
+                    return value
+            value = compute()
+            if value is not None and (should_cache is None or should_cache(value)):
+                self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            if acquired:
+                self._release_lease(key)
+
+
+def create_cache(backend=CACHE_BACKEND):
+    """
+    Returns the cache backend selected by CACHE_BACKEND ("sqlite" or "memory").
+    """
+    if backend == "memory":
+        return InProcessCache()
+    if backend == "sqlite":
+        return SQLiteCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
@@ -0,0 +1,203 @@
+import base64
+import contextvars
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import requests
+
+# Record/replay of upstream responses (NewsAPI, Google News, Gemini) for reproducing
+# slow or surprising lookups offline. A cassette is active for the current request
+# (and the ingestion threads it starts) only; see Cassette.activate().
+CASSETTE_DIR = os.environ.get("CASSETTE_DIR", os.path.join(tempfile.gettempdir(), "iposubs-cassettes"))
+
+_active_cassette = contextvars.ContextVar("active_cassette", default=None)
+
+# Query-string credentials (NewsAPI's apiKey, Google's key) that can appear in error messages
+_SECRET_PARAM_RE = re.compile(r"(?i)\b((?:api[_-]?key|key)=)[^&\s'\"]+")
+
+
+class CassetteMiss(RuntimeError):
+    """Raised in replay mode when the cassette has no recording for an upstream call."""
+
+
+def active_cassette():
+    return _active_cassette.get()
+
+
+class Cassette:
+    """
+    Upstream interactions recorded for one request, keyed by a request signature
+    (API keys are never part of the key or the file).
+
+    mode "record": calls go upstream and their responses are stored.
+    mode "replay": calls are answered from the stored responses, with no network access.
+    Repeated calls with the same key are replayed in the order they were recorded.
+    """
+
+    def __init__(self, mode, request_info=None, interactions=None, simulate_latency=False):
+        self.mode = mode
+        self.request_info = request_info or {}
+        self.interactions = interactions or {} # key -> [entry, ...]
+        self.simulate_latency = simulate_latency # Replay: sleep for the recorded upstream time
+        self._replay_positions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, simulate_latency=False):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls("replay", data.get("request"), data.get("interactions"), simulate_latency=simulate_latency)
+
+    def save(self, directory=CASSETTE_DIR):
+        """
+        Writes the cassette to `directory` and returns the file path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        label = re.sub(r"[^A-Za-z0-9]+", "-", str(self.request_info.get("args", {}).get("ipo_name", "request"))).strip("-")
+        # The random suffix keeps recordings made in the same second from overwriting each other
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{label or 'request'}-{uuid.uuid4().hex[:8]}.json")
+        with self._lock:
+            data = {"request": self.request_info, "interactions": self.interactions}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return path
+
+    def activate(self):
+        """
+        Makes this cassette active for the current context. Returns a token for deactivate().
+        """
+        return _active_cassette.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _active_cassette.reset(token)
+
+    def record(self, key, entry):
+        with self._lock:
+            self.interactions.setdefault(key, []).append(entry)
+
+    def replay(self, key):
+        with self._lock:
+            entries = self.interactions.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recorded response for {key}")
+            position = self._replay_positions.get(key, 0)
+            self._replay_positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+        if self.simulate_latency:
+            time.sleep(entry.get("elapsed", 0))
+        return entry
+
+
+class RecordedResponse:
+    """
+    Minimal stand-in for requests.Response built from a recorded HTTP interaction.
+    """
+
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url} (replayed)", response=self)
+
+
+def _recorded_error(e):
+    """
+    Describes an upstream failure for the cassette file, with credentials removed.
+    """
+    message = _SECRET_PARAM_RE.sub(r"\1REDACTED", str(e))
+    # Keys can also be echoed without a parameter name (e.g. in Gemini errors)
+    for secret in (os.environ.get("NEWS_API_KEY"), os.environ.get("GEMINI_API_KEY")):
+        if secret:
+            message = message.replace(secret, "REDACTED")
+    return f"{type(e).__name__}: {message}"
+
+
+def _http_key(url, params):
+    params = sorted((k, str(v)) for k, v in (params or {}).items() if k.lower() != "apikey")
+    return f"GET {url}?{urlencode(params)}"
+
+
+def http_get(url, params=None, **kwargs):
+    """
+    requests.get that records to / replays from the active cassette, if any.
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return requests.get(url, params=params, **kwargs)
+
+    key = _http_key(url, params)
+    if cassette.mode == "replay":
+        entry = cassette.replay(key)
+        if "error" in entry:
+            raise requests.ConnectionError(f"{entry['error']} (replayed)")
+        return RecordedResponse(url, entry["status_code"], base64.b64decode(entry["content"]))
+
+    started = time.monotonic()
+    try:
+        response = requests.get(url, params=params, **kwargs)
+    except requests.RequestException as e:
+        cassette.record(key, {"error": _recorded_error(e), "elapsed": round(time.monotonic() - started, 3)})
+        raise
+    cassette.record(key, {
+        "status_code": response.status_code,
+        "content": base64.b64encode(response.content).decode("ascii"),
+        "elapsed": round(time.monotonic() - started, 3)
+    })
+    return response
+
+
+def _gemini_key(model, prompt, generation_config):
+    signature = f"{getattr(model, 'model_name', '')}\n{generation_config!r}\n{prompt}"
+    return f"gemini {hashlib.sha256(signature.encode('utf-8')).hexdigest()}"
+
+
+def generate_content(model, prompt, **kwargs):
+    """
+    model.generate_content that records to / replays from the active cassette, if any.
+    Only the response text and output token count are kept.
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return model.generate_content(prompt, **kwargs)
+
+    key = _gemini_key(model, prompt, kwargs.get("generation_config"))
+    if cassette.mode == "replay":
+        entry = cassette.replay(key)
+        if "error" in entry:
+            raise RuntimeError(f"{entry['error']} (replayed)")
+        return SimpleNamespace(text=entry["text"],
+                               usage_metadata=SimpleNamespace(candidates_token_count=entry.get("output_tokens", 0)))
+
+    started = time.monotonic()
+    try:
+        response = model.generate_content(prompt, **kwargs)
+        text = response.text
+    except Exception as e:
+        cassette.record(key, {"error": _recorded_error(e), "elapsed": round(time.monotonic() - started, 3)})
+        raise
+    usage = getattr(response, "usage_metadata", None)
+    cassette.record(key, {
+        "text": text,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        "elapsed": round(time.monotonic() - started, 3)
+    })
+    return response
@@ -1,29 +1,112 @@
 import requests
 import os
+import sys
+import time
+import json
+import re
+import contextvars
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
 from urllib.parse import quote # Import quote for URL encoding
+from cassette import http_get # requests.get with record/replay support
+
+REQUEST_TIMEOUT = 10 # Seconds; upper bound for a single upstream HTTP request
+
+NEWSAPI_URL = "https://newsapi.org/v2/everything"
+NEWSAPI_MAX_PAGE_SIZE = 100 # Hard limit imposed by NewsAPI
+# Developer plans can only page through the first 100 results; raise this on paid plans.
+NEWSAPI_MAX_RESULTS = int(os.environ.get("NEWSAPI_MAX_RESULTS", "100"))
+# Full-size pages by default so a typical lookup costs one request, as in single mode
+NEWSAPI_PAGE_SIZE = int(os.environ.get("NEWSAPI_PAGE_SIZE", "100"))
+NEWSAPI_CONCURRENT_PAGES = int(os.environ.get("NEWSAPI_CONCURRENT_PAGES", "3"))
+NEWSAPI_MAX_QUERY_LENGTH = 500 # NewsAPI rejects longer 'q' values
+
+
+class Article:
+    """
+    Compact news article record passed from ingestion through analysis.
+    Only the fields the pipeline uses are kept; `text` is the article content
+    (or the description when there is no content) and `source` is interned
+    since the same few publisher names repeat across thousands of articles.
+    """
+    __slots__ = ("title", "url", "text", "source")
+
+    def __init__(self, title, url, text, source):
+        self.title = title or "N/A"
+        self.url = url or "N/A"
+        self.text = text or ""
+        self.source = sys.intern(source) if source else "N/A"
+
+    def __repr__(self):
+        return f"Article(title={self.title!r}, url={self.url!r}, source={self.source!r})"
+
+    def to_dict(self):
+        return {"title": self.title, "url": self.url, "text": self.text, "source": self.source}
+
+
+def _newsapi_object_pairs_hook(pairs):
+    """
+    json object_pairs_hook that turns NewsAPI objects into compact records while
+    the response is decoded, so unused fields (urlToImage, author, publishedAt,
+    duplicate description/content) are dropped as soon as each object is parsed.
+    """
+    obj = dict(pairs)
+    if "url" in obj:
+        return Article(obj.get("title"), obj.get("url"), obj.get("content") or obj.get("description"),
+                       obj.get("source"))
+    if obj.keys() <= {"id", "name"}:
+        # Nested source object - keep only the name
+        return obj.get("name")
+    return obj
+
+
+def decode_newsapi_response(raw_bytes):
+    """
+    Decodes a NewsAPI response body into a dict whose 'articles' are Article records.
+    """
+    return json.loads(raw_bytes, object_pairs_hook=_newsapi_object_pairs_hook)
+
+
+def remaining_timeout(deadline, default=REQUEST_TIMEOUT):
+    """
+    Returns the timeout to use for the next upstream call.
+    `deadline` is an absolute time.monotonic() value or None for no deadline.
+    Returns 0 when the deadline has already passed.
+    """
+    if deadline is None:
+        return default
+    return max(0.0, min(default, deadline - time.monotonic()))
+
 
 # Fallback to a general news scraping if NewsAPI key is not available or fails
 # For this, we'll try to scrape Google News search results.
 # Note: Scraping Google News can be unreliable due to changes in their HTML structure.
-def scrape_google_news(query, max_articles=10):
+def scrape_google_news(query, max_articles=10, deadline=None):
     """
-    Scrapes Google News for articles related to the query.
+    Scrapes Google News for articles related to the query (a name or a list of
+    alternative names).
     This is a fallback and might be brittle.
     """
+    terms = _search_terms(query)
+    query = " OR ".join(terms)
     articles = []
+    timeout = remaining_timeout(deadline)
+    if timeout <= 0:
+        print(f"Deadline passed before Google News scraping for '{query}'. Skipping.")
+        return articles
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
     # URL encode the query
-    encoded_query = quote(query + " IPO stock market sentiment")
+    encoded_query = quote((f"({query})" if len(terms) > 1 else query) + " IPO stock market sentiment")
     search_url = f"https://news.google.com/search?q={encoded_query}&hl=en-US&gl=US&ceid=US:en"
 
     # IMPORTANT: Scraping web pages, especially dynamic ones like Google News, is prone to breaking
     # if the website changes its HTML structure. This method is provided as a fallback
     # and may require updates if it stops working. Using official APIs is always more reliable.
     try:
-        response = requests.get(search_url, headers=headers, timeout=10)
+        response = http_get(search_url, headers=headers, timeout=timeout)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
 
@@ -59,15 +142,12 @@ def scrape_google_news(query, max_articles=10):
 
             if title != "N/A" and url:
                  # Basic filter: ensure query terms are in title or snippet
-                if any(term.lower() in title.lower() for term in query.split()) or \
-                   any(term.lower() in description.lower() for term in query.split()):
-                    articles.append({
-                        "title": title,
-                        "url": url,
-                        "description": description, # Snippet from search results
-                        "content": description, # For now, use description as content
-                        "source": {"name": "Google News"} # Source is Google News itself
-                    })
+                words = [word for term in terms for word in term.split()]
+                if any(word.lower() in title.lower() for word in words) or \
+                   any(word.lower() in description.lower() for word in words):
+                    # The snippet from search results is used as the article text for now.
+                    # Source is Google News itself.
+                    articles.append(Article(title, url, description, "Google News"))
                     count += 1
 
         if not articles:
@@ -81,26 +161,67 @@ def scrape_google_news(query, max_articles=10):
     return articles[:max_articles]
 
 
-def fetch_news_from_newsapi(query, api_key, max_articles=20):
+def _search_terms(query):
     """
-    Fetches news articles from NewsAPI.
+    Accepts a single name or a list of alternative names (e.g. an IPO's aliases).
     """
-    articles = []
+    return [query] if isinstance(query, str) else list(query)
+
+
+@lru_cache(maxsize=1024)
+def _name_pattern(name):
+    # Whole-word match so short names like "LIC" don't match "public" or "policy"
+    return re.compile(r"(?<!\w)" + re.escape(name.strip()) + r"(?!\w)", re.IGNORECASE)
+
+
+def is_relevant_article(article, ipo_name):
+    """
+    Basic relevance check - the IPO name (or any of a list of its names) must be
+    mentioned in the article text as whole words.
+    """
+    if not article.text:
+        return False
+    return any(_name_pattern(name).search(article.text) for name in _search_terms(ipo_name) if name.strip())
+
+
+def _newsapi_search_query(query):
     # Add "IPO" and "stock" to the query to make it more specific for IPO sentiment
-    search_query = f'"{query}" IPO OR stock sentiment'
-    # NewsAPI endpoint for everything
-    url = "https://newsapi.org/v2/everything"
+    terms = _search_terms(query)
+    if len(terms) == 1:
+        return f'"{terms[0]}" IPO OR stock sentiment'
+    names = " OR ".join(f'"{term}"' for term in terms)
+    return f'({names}) IPO OR stock sentiment'
+
+
+def _request_newsapi_page(search_query, api_key, page, page_size, timeout):
+    """
+    Requests a single page of NewsAPI results. Raises requests.RequestException on failure.
+    """
     params = {
         'q': search_query,
         'language': 'en',
         'sortBy': 'relevancy', # Options: relevancy, popularity, publishedAt
-        'pageSize': max_articles if max_articles <= 100 else 100, # Max 100 for NewsAPI
+        'pageSize': page_size,
+        'page': page,
         'apiKey': api_key
     }
+    response = http_get(NEWSAPI_URL, params=params, timeout=timeout)
+    response.raise_for_status() # Raise an exception for HTTP errors (incl. maximumResultsReached)
+    return decode_newsapi_response(response.content)
+
+
+def fetch_news_from_newsapi(query, api_key, max_articles=20, deadline=None):
+    """
+    Fetches news articles from NewsAPI. `query` is a name or a list of alternative names.
+    """
+    articles = []
+    timeout = remaining_timeout(deadline)
+    if timeout <= 0:
+        print(f"Deadline passed before NewsAPI request for '{query}'. Skipping.")
+        return articles
+    search_query = _newsapi_search_query(query)
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status() # Raise an exception for HTTP errors
-        data = response.json()
+        data = _request_newsapi_page(search_query, api_key, 1, min(max_articles, NEWSAPI_MAX_PAGE_SIZE), timeout)
         articles = data.get('articles', [])
         # NewsAPI 'content' field is often truncated. 'description' can be a good summary.
         # We might need to fetch the full content from the article URL later if needed.
@@ -115,17 +236,231 @@ def fetch_news_from_newsapi(query, api_key, max_articles=20):
     return articles
 
 
-def fetch_news_for_ipo(ipo_name, news_api_key, max_articles=30):
+def _fetch_newsapi_pages(search_query, api_key, on_page, page_size=NEWSAPI_PAGE_SIZE,
+                         max_concurrent_pages=NEWSAPI_CONCURRENT_PAGES, deadline=None):
+    """
+    Requests page 1 of `search_query` on its own and, only if more pages are needed,
+    the rest concurrently with up to `max_concurrent_pages` in flight. Calls
+    `on_page(page, articles)` as each one arrives (pages may arrive out of order).
+    No further pages are requested once `on_page` returns True, the result window
+    (NEWSAPI_MAX_RESULTS / totalResults) is exhausted, a page fails, or the deadline passes.
+    Returns True if every result NewsAPI has for the query was received.
+    """
+    page_size = max(1, min(page_size, NEWSAPI_MAX_PAGE_SIZE))
+    max_pages = max(1, NEWSAPI_MAX_RESULTS // page_size)
+
+    total_results = None # Learned from the first response that arrives
+    next_page = 1
+    stop = False
+    failed = False # A page failed or the deadline passed, so results may be missing
+    last_page = None # First page that came back empty, if any
+    received = set()
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrent_pages)) as executor:
+        while True:
+            # Page 1 goes alone so a lookup it satisfies costs one request; after that
+            # keep up to max_concurrent_pages requests outstanding
+            concurrency = max_concurrent_pages if total_results is not None else 1
+            while not stop and len(in_flight) < concurrency and next_page <= max_pages:
+                if total_results is not None and (next_page - 1) * page_size >= total_results:
+                    break
+                timeout = remaining_timeout(deadline)
+                if timeout <= 0:
+                    print(f"Deadline passed while paging NewsAPI for '{search_query}'.")
+                    stop = failed = True
+                    break
+                # Run in a copy of the caller's context so an active cassette applies to page requests too
+                future = executor.submit(contextvars.copy_context().run, _request_newsapi_page,
+                                         search_query, api_key, next_page, page_size, timeout)
+                in_flight[future] = next_page
+                next_page += 1
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                try:
+                    data = future.result()
+                except requests.RequestException as e:
+                    # Usually quota/result-window errors; later pages would fail the same way
+                    print(f"NewsAPI page {page} request failed: {e}. Stopping pagination.")
+                    stop = failed = True
+                    continue
+                except Exception as ex:
+                    print(f"An unexpected error occurred with NewsAPI page {page}: {ex}. Stopping pagination.")
+                    stop = failed = True
+                    continue
+
+                total_results = data.get('totalResults', total_results)
+                page_articles = data.get('articles', [])
+                received.add(page)
+                if not page_articles:
+                    last_page = page if last_page is None else min(last_page, page)
+                if on_page(page, page_articles) or not page_articles:
+                    stop = True
+
+    if failed or total_results is None:
+        return False
+    pages_needed = -(-total_results // page_size)
+    if last_page is not None:
+        pages_needed = min(pages_needed, last_page - 1)
+    return pages_needed <= max_pages and all(page in received for page in range(1, pages_needed + 1))
+
+
+def _merge_pages(articles_by_page, limit):
+    """
+    Flattens {page: [Article, ...]} in page order, de-duplicated by URL.
+    """
+    articles = []
+    seen_urls = set()
+    for page in sorted(articles_by_page):
+        for article in articles_by_page[page]:
+            if article.url in seen_urls:
+                continue
+            seen_urls.add(article.url)
+            articles.append(article)
+    return articles[:limit]
+
+
+def fetch_news_from_newsapi_paginated(query, api_key, target_relevant=30, page_size=NEWSAPI_PAGE_SIZE,
+                                      max_concurrent_pages=NEWSAPI_CONCURRENT_PAGES, deadline=None):
+    """
+    Fetches several NewsAPI pages concurrently, applying the relevance filter as each
+    page arrives (`query` is a name or a list of alternative names), and stops
+    requesting pages once `target_relevant` relevant articles
+    have been collected (see _fetch_newsapi_pages for the other stop conditions).
+    Returns only relevant articles, de-duplicated by URL, in page order.
+    """
+    relevant_by_page = {}
+
+    def on_page(page, page_articles):
+        relevant_by_page[page] = [article for article in page_articles if is_relevant_article(article, query)]
+        return sum(len(relevant) for relevant in relevant_by_page.values()) >= target_relevant
+
+    _fetch_newsapi_pages(_newsapi_search_query(query), api_key, on_page, page_size=page_size,
+                         max_concurrent_pages=max_concurrent_pages, deadline=deadline)
+    articles = _merge_pages(relevant_by_page, target_relevant)
+    print(f"Fetched {len(articles)} relevant articles from {len(relevant_by_page)} NewsAPI page(s) for query: {query}")
+    return articles
+
+
+def build_consolidated_queries(ipo_names, max_query_length=NEWSAPI_MAX_QUERY_LENGTH, search_terms=None,
+                               max_names=None):
+    """
+    Greedily packs IPO names into groups of at most `max_names` whose combined
+    OR-query stays within NewsAPI's query-length limit. Returns a list of name lists.
+    """
+    search_terms = search_terms or {}
+
+    def query_for(names):
+        return _newsapi_search_query([term for name in names for term in search_terms.get(name, [name])])
+
+    groups = []
+    current = []
+    for name in ipo_names:
+        if current and ((max_names and len(current) >= max_names)
+                        or len(query_for(current + [name])) > max_query_length):
+            groups.append(current)
+            current = []
+        current.append(name)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def fetch_news_for_ipos(ipo_names, news_api_key, max_articles=30, deadline=None, search_terms=None,
+                        paginated=False, report=None):
+    """
+    Fetches news for many IPOs with a few consolidated NewsAPI OR-queries instead of
+    one request per IPO, then routes each returned article locally to every IPO it
+    mentions (using the same relevance check as the single-IPO path).
+    `search_terms` optionally maps an IPO name to the names to search for and match.
+
+    Each consolidated query uses the single-IPO query terms with the IPOs' names
+    OR-ed together, and groups are sized so that every IPO could get `max_articles`
+    results within the NewsAPI result window. An IPO's articles are only taken from
+    its group if that is at least as complete as its own query would be: either it
+    got `max_articles` of them or the group's whole result set was fetched (the
+    consolidated query matches a superset of the single-IPO one). Otherwise it is
+    fetched on its own with fetch_news_for_ipo (`paginated` selects the mode). IPOs
+    left without articles fall back to Google News scraping, as in fetch_news_for_ipo.
+
+    If a `report` dict is given, report["deadline_exceeded"] is set as in fetch_news_for_ipo.
+    Returns {ipo_name: [Article, ...]} with at most `max_articles` per IPO.
+    """
+    if report is not None:
+        report["deadline_exceeded"] = False
+    ipo_names = [name.replace('"', '').strip() for name in ipo_names]
+    ipo_names = list(dict.fromkeys(name for name in ipo_names if name))
+    search_terms = {name: (search_terms or {}).get(name) or [name] for name in ipo_names}
+    routed = {name: {} for name in ipo_names} # name -> {page: [Article, ...]}
+    complete = set() # IPOs whose group returned its whole result set
+
+    if news_api_key:
+        names_per_query = max(1, NEWSAPI_MAX_RESULTS // max(1, max_articles))
+        groups = build_consolidated_queries(ipo_names, search_terms=search_terms, max_names=names_per_query)
+        print(f"Fetching news for {len(ipo_names)} IPOs with {len(groups)} consolidated NewsAPI queries.")
+        for group in groups:
+            counts = dict.fromkeys(group, 0)
+
+            def on_page(page, page_articles, group=group, counts=counts):
+                for name in group:
+                    matches = [article for article in page_articles if is_relevant_article(article, search_terms[name])]
+                    routed[name][page] = matches
+                    counts[name] += len(matches)
+                # Stop paging once every IPO in the group has enough articles
+                return all(count >= max_articles for count in counts.values())
+
+            query = _newsapi_search_query([term for name in group for term in search_terms[name]])
+            if _fetch_newsapi_pages(query, news_api_key, on_page, page_size=NEWSAPI_MAX_PAGE_SIZE, deadline=deadline):
+                complete.update(group)
+
+    results = {}
+    for name in ipo_names:
+        articles = _merge_pages(routed[name], max_articles)
+        if len(articles) < max_articles and name not in complete:
+            print(f"Consolidated NewsAPI results for '{name}' may be incomplete. Fetching it individually.")
+            articles = fetch_news_for_ipo(name, news_api_key, max_articles=max_articles, deadline=deadline,
+                                          paginated=paginated, search_terms=search_terms[name])
+        elif not articles:
+            print(f"No consolidated NewsAPI articles for '{name}'. Falling back to Google News scraping.")
+            articles = scrape_google_news(search_terms[name], max_articles=min(max_articles, 20), deadline=deadline)
+        results[name] = articles
+
+    if report is not None and deadline is not None and time.monotonic() >= deadline:
+        report["deadline_exceeded"] = True
+    return results
+
+
+def fetch_news_for_ipo(ipo_name, news_api_key, max_articles=30, deadline=None, paginated=False, report=None,
+                       search_terms=None):
     """
     Fetches news articles for a given IPO name.
     Tries NewsAPI first, then falls back to Google News scraping if NewsAPI key is missing or fails.
+    `search_terms` (default: [ipo_name]) are the names searched for and matched, e.g. an
+    IPO's canonical name and aliases.
+    `deadline` (an absolute time.monotonic() value) caps the time spent across both sources.
+    With `paginated=True`, NewsAPI pages are fetched concurrently until `max_articles`
+    relevant articles are found (see fetch_news_from_newsapi_paginated).
+    If a `report` dict is given, report["deadline_exceeded"] is set to whether the
+    deadline cut ingestion short (paging stopped, a request timed out or the
+    Google News fallback was skipped), so callers can treat the result as partial.
     """
+    if report is not None:
+        report["deadline_exceeded"] = False
+    search_terms = search_terms or [ipo_name]
     fetched_articles = []
     use_news_api = bool(news_api_key)
 
     if use_news_api:
         print(f"Attempting to fetch news for '{ipo_name}' using NewsAPI.")
-        fetched_articles = fetch_news_from_newsapi(ipo_name, news_api_key, max_articles)
+        if paginated:
+            fetched_articles = fetch_news_from_newsapi_paginated(search_terms, news_api_key, target_relevant=max_articles, deadline=deadline)
+        else:
+            fetched_articles = fetch_news_from_newsapi(search_terms, news_api_key, max_articles, deadline=deadline)
 
     if not fetched_articles:
         if use_news_api: # Only print this if NewsAPI was attempted and failed
@@ -135,7 +470,12 @@ def fetch_news_for_ipo(ipo_name, news_api_key, max_articles=30):
 
         # Ensure max_articles for scraper is reasonable, e.g. not more than 20-30 for performance
         scrape_max = min(max_articles, 20)
-        fetched_articles = scrape_google_news(ipo_name, max_articles=scrape_max)
+        fetched_articles = scrape_google_news(search_terms, max_articles=scrape_max, deadline=deadline)
+
+    # Every source shrinks its timeouts to the remaining budget and stops paging or is
+    # skipped once it is spent, so a deadline in the past means some work was cut off.
+    if report is not None and deadline is not None and time.monotonic() >= deadline:
+        report["deadline_exceeded"] = True
 
     if not fetched_articles:
         print(f"No articles found for '{ipo_name}' from any source.")
@@ -188,11 +528,10 @@ if __name__ == '__main__':
         if articles_newsapi:
             for i, article in enumerate(articles_newsapi):
                 print(f"\nArticle {i+1} (NewsAPI):")
-                print(f"  Title: {article.get('title')}")
-                print(f"  Source: {article.get('source', {}).get('name')}")
-                print(f"  URL: {article.get('url')}")
-                # print(f"  Description: {article.get('description')}")
-                # print(f"  Content Snippet: {article.get('content')[:150] if article.get('content') else 'N/A'}...")
+                print(f"  Title: {article.title}")
+                print(f"  Source: {article.source}")
+                print(f"  URL: {article.url}")
+                # print(f"  Text Snippet: {article.text[:150]}...")
         else:
             print("No articles found via NewsAPI for the test.")
     else:
@@ -204,10 +543,10 @@ if __name__ == '__main__':
     if articles_gn_scrape:
         for i, article in enumerate(articles_gn_scrape):
             print(f"\nArticle {i+1} (Google News):")
-            print(f"  Title: {article.get('title')}")
-            print(f"  Source: {article.get('source', {}).get('name')}")
-            print(f"  URL: {article.get('url')}")
-            # print(f"  Description: {article.get('description')}")
+            print(f"  Title: {article.title}")
+            print(f"  Source: {article.source}")
+            print(f"  URL: {article.url}")
+            # print(f"  Text Snippet: {article.text[:150]}...")
     else:
         print("No articles found via Google News scraping for the test.")
 
@@ -0,0 +1,137 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Local file of known IPOs: a JSON list of {"name": ..., "symbol": ..., "aliases": [...]}
+IPO_INDEX_PATH = os.environ.get("IPO_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ipos.json"))
+RELOAD_CHECK_INTERVAL = 5 # Seconds between checks of the index file's modification time
+
+
+def normalize_ipo_name(name):
+    """
+    Lower-cases and collapses whitespace so lookups ignore case and spacing.
+    """
+    return " ".join(name.lower().split())
+
+
+class IPOIndex:
+    """
+    In-memory prefix index over known IPO names, aliases and symbols.
+
+    Keys are kept in a sorted list so a prefix lookup is two bisects plus a short
+    scan. The file at `path` is re-read when its modification time changes, so the
+    list of IPOs can be updated without restarting the app.
+    """
+
+    def __init__(self, path=IPO_INDEX_PATH):
+        self.path = path
+        self._keys = [] # Sorted normalized keys
+        self._entries = [] # Parallel to _keys: (canonical name, symbol)
+        self._exact = {} # normalized key -> canonical name
+        self._terms = {} # canonical name -> [canonical name, alias, ...]
+        self._mtime = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload_if_changed(force=True)
+
+    def load(self, ipos):
+        """
+        Builds the index from a list of IPO dicts and swaps it in atomically.
+        """
+        pairs = []
+        exact = {}
+        terms = {}
+        for ipo in ipos:
+            name = (ipo.get("name") or "").strip()
+            if not name:
+                continue
+            symbol = (ipo.get("symbol") or "").strip().upper()
+            aliases = [alias.strip() for alias in ipo.get("aliases") or [] if alias.strip()]
+            terms.setdefault(name, list(dict.fromkeys([name] + aliases)))
+            for key in [name, symbol] + aliases:
+                normalized = normalize_ipo_name(key)
+                if normalized:
+                    pairs.append((normalized, name, symbol))
+                    exact.setdefault(normalized, name)
+        pairs.sort()
+        # Readers only ever see a complete index
+        self._keys, self._entries, self._exact, self._terms = [p[0] for p in pairs], [(p[1], p[2]) for p in pairs], exact, terms
+
+    def reload_if_changed(self, force=False):
+        """
+        Re-reads the index file if it changed since it was last loaded.
+        Checks are throttled to once per RELOAD_CHECK_INTERVAL unless `force` is set.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        with self._reload_lock:
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if force:
+                    print(f"IPO index file not found at {self.path}. Suggestions will be empty.")
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.load(json.load(f))
+                self._mtime = mtime
+                print(f"Loaded {len(self._keys)} IPO index keys from {self.path}")
+            except (OSError, ValueError) as e:
+                # Keep serving the previous index if the new file is unreadable
+                print(f"Failed to load IPO index from {self.path}: {e}")
+
+    def names(self):
+        """
+        Returns the canonical names of all known IPOs, sorted.
+        """
+        self.reload_if_changed()
+        return sorted(set(self._exact.values()))
+
+    def suggest(self, query, limit=8):
+        """
+        Returns up to `limit` IPOs whose name, alias or symbol starts with `query`,
+        as dicts with the canonical name, symbol and the key that matched.
+        """
+        self.reload_if_changed()
+        prefix = normalize_ipo_name(query)
+        if not prefix:
+            return []
+        keys, entries = self._keys, self._entries
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_right(keys, prefix + "\uffff", lo=start)
+        suggestions = []
+        seen = set()
+        for i in range(start, end):
+            name, symbol = entries[i]
+            if name in seen:
+                continue
+            seen.add(name)
+            suggestions.append({"name": name, "symbol": symbol, "matched": keys[i]})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def canonical_name(self, ipo_name):
+        """
+        Maps an exact name, alias or symbol (ignoring case/spacing) to the canonical
+        IPO name. Unknown names are returned unchanged.
+        """
+        self.reload_if_changed()
+        return self._exact.get(normalize_ipo_name(ipo_name), ipo_name)
+
+    def search_terms(self, ipo_name):
+        """
+        Returns the names to search news for and match articles against: the canonical
+        name and all aliases of a known IPO (whichever of them `ipo_name` is), or just
+        `ipo_name` for an unknown one. Symbols are left out since tickers rarely appear
+        in article text; short aliases are safe because articles are matched on whole
+        words (see data_ingestion.is_relevant_article).
+        """
+        canonical = self.canonical_name(ipo_name)
+        return list(self._terms.get(canonical, [ipo_name]))
@@ -17,10 +17,18 @@ document.addEventListener('DOMContentLoaded', () => {
     const topSnippetsList = document.getElementById('topSnippetsList');
     const sentimentPieChartCanvas = document.getElementById('sentimentPieChart');
     const downloadPdfButton = document.getElementById('downloadPdfButton');
+    const ipoSuggestionsList = document.getElementById('ipoSuggestions');
     let sentimentPieChart = null; // To store the Chart.js instance
     let currentIpoName = ""; // Store the current IPO name for PDF download
+    const SUGGEST_DEBOUNCE_MS = 150;
+    let suggestTimer = null;
+    let suggestController = null; // Aborts the previous suggest request when a new one starts
 
     searchButton.addEventListener('click', fetchSentimentData);
+    ipoNameInput.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        suggestTimer = setTimeout(fetchSuggestions, SUGGEST_DEBOUNCE_MS);
+    });
     ipoNameInput.addEventListener('keypress', (event) => {
         if (event.key === 'Enter') {
             fetchSentimentData();
@@ -36,6 +44,36 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    async function fetchSuggestions() {
+        const query = ipoNameInput.value.trim();
+        if (suggestController) {
+            suggestController.abort();
+        }
+        if (!query) {
+            ipoSuggestionsList.innerHTML = '';
+            return;
+        }
+        suggestController = new AbortController();
+        try {
+            const response = await fetch(`/api/ipos/suggest?q=${encodeURIComponent(query)}`, { signal: suggestController.signal });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            ipoSuggestionsList.innerHTML = ''; // Clear previous
+            (data.suggestions || []).forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.name;
+                option.label = suggestion.symbol ? `${suggestion.name} (${suggestion.symbol})` : suggestion.name;
+                ipoSuggestionsList.appendChild(option);
+            });
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error("Suggest error:", error);
+            }
+        }
+    }
+
     async function fetchSentimentData() {
         currentIpoName = ipoNameInput.value.trim(); // Store/update current IPO name
         if (!currentIpoName) {
@@ -50,7 +88,7 @@ document.addEventListener('DOMContentLoaded', () => {
         downloadPdfButton.classList.add('hidden'); // Hide PDF button during load
 
         try {
-            const response = await fetch(`/api/sentiment?ipo_name=${encodeURIComponent(ipoName)}`);
+            const response = await fetch(`/api/sentiment?ipo_name=${encodeURIComponent(currentIpoName)}`);
             showLoading(false);
 
             if (!response.ok) {